@@ -2,10 +2,16 @@
 import os
 import sys
 import json
-import urllib.request
+import http.client
+import urllib.parse
 import argparse
-import hashlib
-from datetime import datetime, timedelta
+import time
+import tempfile
+import threading
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 
 # Global verbose flag
 VERBOSE = False
@@ -13,14 +19,138 @@ VERBOSE = False
 # State file to track last notifications
 STATE_FILE = os.path.join(os.path.dirname(__file__), '.notification_state.json')
 
+# Idle kept-alive HTTPS connections per host (Huxley and Telegram)
+_CONNECTIONS = {}
+_CONNECTIONS_LOCK = threading.Lock()
+
+# Recent Huxley responses by URL, with their HTTP validators:
+# {url: {'fetched': epoch, 'etag': ..., 'last_modified': ..., 'body': str}}
+_CACHE = {}
+_CACHE_LOCKS = {}
+_CACHE_LOCK = threading.Lock()
+CACHE_TTL_SECONDS = 45
+
+# Cached responses with validators are persisted in the state file under
+# this key so the next run can revalidate them; entries older than this
+# are dropped
+RESPONSES_STATE_KEY = '_responses'
+RESPONSES_MAX_AGE_SECONDS = 60 * 60
+
+# Telegram allows about one message per second and 20 per minute to a chat;
+# recent send times are persisted so back-to-back runs respect the limit
+TELEGRAM_MIN_INTERVAL_SECONDS = 1.0
+TELEGRAM_MAX_PER_MINUTE = 20
+TELEGRAM_SENDS_STATE_KEY = '_telegram_sends'
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+_SEND_TIMES = deque(maxlen=TELEGRAM_MAX_PER_MINUTE)
+_SEND_LOCK = threading.Lock()
+
+# Identical alerts for any of a trip's trains are suppressed for this long;
+# each trip remembers at most MAX_RECENT_SIGNATURES of them
+RECENT_SIGNATURE_TTL_SECONDS = 15 * 60
+MAX_RECENT_SIGNATURES = 20
+
+# Only the next few departures are considered for alerts
+TRAINS_TO_CHECK = 3
+
+# Upper bound on trips checked in parallel
+MAX_WORKERS = 8
+
 def vprint(*args, **kwargs):
     """Print only in verbose mode"""
     if VERBOSE:
         print(*args, **kwargs)
 
+def http_request(method, url, body=None, headers=None, timeout=10):
+    """
+    Send a request over a kept-alive HTTPS connection to the url's host.
+    Returns: (status, headers, body_bytes)
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path + (f"?{parts.query}" if parts.query else '')
+    
+    # Retry once on a fresh socket if the server dropped the idle connection
+    for attempt in range(2):
+        with _CONNECTIONS_LOCK:
+            idle = _CONNECTIONS.setdefault(parts.netloc, [])
+            conn = idle.pop() if idle else None
+        if conn is None:
+            conn = http.client.HTTPSConnection(parts.netloc, timeout=timeout)
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            result = resp.status, resp.headers, resp.read()
+        except Exception as e:
+            conn.close()
+            stale = isinstance(e, (http.client.HTTPException, ConnectionError))
+            if attempt or not stale:
+                raise
+            continue
+        
+        # Hand the connection back for the next request to this host
+        with _CONNECTIONS_LOCK:
+            _CONNECTIONS[parts.netloc].append(conn)
+        return result
+
+def cached_get(url, ttl=CACHE_TTL_SECONDS):
+    """
+    GET a url, reusing a response fetched within the last ttl seconds.
+    Older responses are revalidated with If-None-Match/If-Modified-Since.
+    Returns: body as str
+    """
+    # One lock per url so trips sharing a route wait for a single fetch
+    with _CACHE_LOCK:
+        url_lock = _CACHE_LOCKS.setdefault(url, threading.Lock())
+    
+    with url_lock:
+        entry = _CACHE.get(url)
+        if entry and time.time() - entry['fetched'] < ttl:
+            vprint(f"♻️  Using cached response ({int(time.time() - entry['fetched'])}s old)")
+            return entry['body']
+        
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        
+        status, resp_headers, body = http_request('GET', url, headers=headers)
+        if status == 304 and entry:
+            vprint(f"♻️  Response not modified since last fetch")
+            entry['fetched'] = time.time()
+            return entry['body']
+        if status != 200:
+            raise RuntimeError(f"HTTP {status}")
+        
+        _CACHE[url] = {
+            'fetched': time.time(),
+            'etag': resp_headers.get('ETag'),
+            'last_modified': resp_headers.get('Last-Modified'),
+            'body': body.decode()
+        }
+        return _CACHE[url]['body']
+
 def load_config(path):
     with open(path, 'r') as f:
-        return json.load(f)
+        config = json.load(f)
+    
+    for trip in config.get('trips', []):
+        compile_trip(trip)
+    return config
+
+def compile_trip(trip):
+    """
+    Precompute the values check_trip needs on every poll, so day names,
+    times and criteria defaults are parsed once per config load.
+    Adds underscore-prefixed keys to the trip dict and returns it.
+    """
+    criteria = trip.get('criteria', {})
+    trip['_days'] = frozenset(day.lower() for day in trip['days'])
+    trip['_time_start'] = minute_of_day(trip['time_start'])
+    trip['_time_end'] = minute_of_day(trip['time_end'])
+    trip['_threshold'] = criteria.get('delay_threshold_minutes', 5)
+    trip['_notify_platform'] = criteria.get('notify_platform', True)
+    return trip
 
 def load_state():
     """Load the last notification state"""
@@ -28,6 +158,14 @@ def load_state():
         try:
             with open(STATE_FILE, 'r') as f:
                 state = json.load(f)
+                _CACHE.update(state.pop(RESPONSES_STATE_KEY, {}))
+                _SEND_TIMES.extend(state.pop(TELEGRAM_SENDS_STATE_KEY, []))
+                
+                # Drop expired entries from each trip's recent alerts
+                cutoff = time.time() - RECENT_SIGNATURE_TTL_SECONDS
+                for trip_state in state.values():
+                    recent = trip_state.get('recent', {})
+                    trip_state['recent'] = {key: sent for key, sent in recent.items() if sent >= cutoff}
                 vprint(f"📂 Loaded state with {len(state)} trip states")
                 return state
         except:
@@ -38,277 +176,395 @@ def load_state():
 
 def save_state(state):
     """Save the current notification state"""
+    # Keep recent responses the next run can revalidate; without an ETag or
+    # Last-Modified they would just be re-fetched, so don't store them
+    cutoff = time.time() - RESPONSES_MAX_AGE_SECONDS
+    responses = {url: entry for url, entry in _CACHE.items()
+                 if entry['fetched'] >= cutoff and (entry.get('etag') or entry.get('last_modified'))}
+    
+    # Only sends from the last minute matter for rate limiting
+    recent_sends = [sent for sent in _SEND_TIMES if sent >= time.time() - 60]
+    
+    # Write compact JSON to a uniquely named temp file, fsync it and rename
+    # it into place: the state file is then either the old or the new
+    # version, even if the run crashes, the machine loses power mid-write,
+    # or two runs overlap (cron plus --daemon, or a slow tick)
+    tmp_file = None
     try:
-        with open(STATE_FILE, 'w') as f:
-            json.dump(state, f, indent=2)
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(STATE_FILE),
+                                        prefix=os.path.basename(STATE_FILE) + '.', suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({**state, RESPONSES_STATE_KEY: responses,
+                       TELEGRAM_SENDS_STATE_KEY: recent_sends}, f, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, STATE_FILE)
         vprint(f"💾 State saved successfully")
     except Exception as e:
         print(f"⚠️  Could not save state: {e}")
+        if tmp_file:
+            try:
+                os.remove(tmp_file)
+            except OSError:
+                pass
 
-def get_train_signature(trip_name, train):
-    """Create a unique signature for a train's current state"""
-    # Include key identifying and state information
-    components = [
-        trip_name,
+def get_train_signature(train):
+    """
+    Create a signature for a train's current state.
+    It is only compared for equality, so a plain tuple is enough; it is
+    stored as a JSON list in the state file.
+    """
+    return (
         train.get('std', ''),  # Scheduled time
         train.get('etd', ''),  # Estimated time
-        str(train.get('isCancelled', False)),
-        train.get('platform', 'unknown')
-    ]
-    signature = '|'.join(components)
-    return hashlib.md5(signature.encode()).hexdigest()
+        bool(train.get('isCancelled', False)),
+        train.get('platform') or 'unknown'
+    )
+
+def signature_key(signature):
+    """Readable string form of a train signature, used as a dict key"""
+    return '|'.join(map(str, signature))
 
-def should_notify_train(trip_name, train, last_state):
+def should_notify_train(train, last_state, now_ts):
     """
     Determine if we should notify about this train.
     Returns: (should_notify, reason)
     """
     std = train.get('std', '')
+    current_signature = get_train_signature(train)
     
     # Check if we have previous notification for this specific train time
     if last_state and last_state.get('train_time') == std:
-        # Same train - check if signature changed
-        current_signature = get_train_signature(trip_name, train)
-        last_signature = last_state.get('signature')
+        # Same train - check if signature changed; a status reverting to an
+        # earlier one (e.g. platform 3 -> 4 -> 3) is still a change
+        last_signature = tuple(last_state.get('signature') or ())
         
         if current_signature == last_signature:
             return False, "duplicate"  # No change
         else:
             return True, "changed"  # Something changed
     elif last_state and last_state.get('train_time'):
-        # Different train time
-        # Check if last notification was recent (within 15 minutes)
-        # to avoid spamming when trains pass and new ones appear
-        last_time_str = last_state.get('timestamp', '')
-        if last_time_str:
-            try:
-                from datetime import datetime
-                last_time = datetime.strptime(last_time_str, '%Y-%m-%d %H:%M:%S')
-                now = datetime.now()
-                time_diff = (now - last_time).total_seconds() / 60  # minutes
-                
-                # If last notification was less than 10 minutes ago, be cautious
-                # Only notify if it's for an earlier train (user might want to catch it)
-                if time_diff < 10:
-                    last_train_time = last_state.get('train_time', '')
-                    if std > last_train_time:
-                        # New train is later - probably don't need to notify yet
-                        return False, "too_soon"
-            except:
-                pass
-        
+        # Different train time - skip it if the same alert for it went out recently
+        sent = last_state.get('recent', {}).get(signature_key(current_signature))
+        if sent is not None and now_ts - sent < RECENT_SIGNATURE_TTL_SECONDS:
+            return False, "recently_notified"
         return True, "new_train"
     else:
         # No previous state - first notification
         return True, "first_notification"
 
 
+def wait_for_telegram_slot():
+    """Sleep until another message would stay within Telegram's rate limits"""
+    now = time.time()
+    delay = 0
+    if _SEND_TIMES:
+        delay = TELEGRAM_MIN_INTERVAL_SECONDS - (now - _SEND_TIMES[-1])
+    if len(_SEND_TIMES) == TELEGRAM_MAX_PER_MINUTE:
+        delay = max(delay, 60 - (now - _SEND_TIMES[0]))
+    
+    if delay > 0:
+        vprint(f"⏳ Waiting {delay:.1f}s for Telegram rate limit")
+        time.sleep(delay)
+    _SEND_TIMES.append(time.time())
+
 def send_telegram(token, chat_id, message):
     url = f"https://api.telegram.org/bot{token}/sendMessage"
     data = json.dumps({"chat_id": chat_id, "text": message}).encode()
-    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
-    try:
-        with urllib.request.urlopen(req, timeout=10) as resp:
-            result = resp.read()
-            vprint(f"✅ Telegram message sent successfully")
-            return result
-    except Exception as e:
-        print(f"❌ Telegram error: {e}")
-        return None
+    
+    # Sends are serialised so concurrent trips share the rate limit
+    with _SEND_LOCK:
+        for attempt in range(2):
+            wait_for_telegram_slot()
+            try:
+                status, _, result = http_request('POST', url, body=data, headers={'Content-Type': 'application/json'})
+                
+                # Too Many Requests: honour retry_after once, then give up
+                if status == 429 and not attempt:
+                    retry_after = json.loads(result).get('parameters', {}).get('retry_after', 1)
+                    print(f"⏳ Telegram rate limited - retrying in {retry_after}s")
+                    time.sleep(retry_after + 1)
+                    continue
+                
+                if status != 200:
+                    raise RuntimeError(f"HTTP {status}: {result.decode(errors='replace')}")
+                vprint(f"✅ Telegram message sent successfully")
+                return result
+            except Exception as e:
+                print(f"❌ Telegram error: {e}")
+                return None
 
-def is_time_in_range(current_time, start_time, end_time):
-    """Check if current time is within the specified range"""
-    start = datetime.strptime(start_time, '%H:%M').time()
-    end = datetime.strptime(end_time, '%H:%M').time()
-    current = datetime.strptime(current_time, '%H:%M').time()
+def send_alerts(config, state, alerts):
+    """
+    Deliver the alerts gathered during a pass, packing as many as fit into
+    each Telegram message so simultaneous alerts cost one request.
+    A trip's state is only updated once its alert was delivered, so alerts
+    in a failed batch are retried on the next pass.
+    alerts: list of (trip_name, reason, message, trip_state)
+    """
+    batches = []
+    for alert in alerts:
+        message = alert[2]
+        if batches and len(batches[-1][1]) + 2 + len(message) <= TELEGRAM_MAX_MESSAGE_LENGTH:
+            batches[-1][0].append(alert)
+            batches[-1][1] += f"\n\n{message}"
+        else:
+            batches.append([[alert], message])
     
-    if start <= end:
-        in_range = start <= current <= end
+    for batch_alerts, text in batches:
+        vprint(f"📱 Sending message:\n{text}")
+        if send_telegram(config['telegram_token'], config['telegram_chat_id'], text) is not None:
+            for trip_name, reason, _, trip_state in batch_alerts:
+                state[trip_name] = trip_state
+                print(f"Alert sent for {trip_name}: {reason}")
+
+def minute_of_day(hhmm):
+    """Convert an 'HH:MM' string to minutes since midnight"""
+    hours, minutes = hhmm.split(':')
+    hours, minutes = int(hours), int(minutes)
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        raise ValueError(f"invalid time '{hhmm}'")
+    return hours * 60 + minutes
+
+def format_minute_of_day(minute):
+    """Convert minutes since midnight back to 'HH:MM'"""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+def is_time_in_range(current_time, start_time, end_time):
+    """Check if current time is within the specified range (minutes since midnight)"""
+    if start_time <= end_time:
+        in_range = start_time <= current_time <= end_time
     else:  # Range crosses midnight
-        in_range = current >= start or current <= end
+        in_range = current_time >= start_time or current_time <= end_time
     
-    vprint(f"🕐 Time check: {current_time} in {start_time}-{end_time} = {in_range}")
+    vprint(f"🕐 Time check: {format_minute_of_day(current_time)} in "
+           f"{format_minute_of_day(start_time)}-{format_minute_of_day(end_time)} = {in_range}")
     return in_range
 
 def is_day_active(current_day, active_days):
-    """Check if current day is in the active days list"""
-    is_active = current_day.lower() in [day.lower() for day in active_days]
-    vprint(f"📅 Day check: {current_day} in {active_days} = {is_active}")
+    """Check if current (lowercase) day is in the set of lowercase active days"""
+    is_active = current_day in active_days
+    vprint(f"📅 Day check: {current_day} in {sorted(active_days)} = {is_active}")
     return is_active
 
+@functools.lru_cache(maxsize=256)
 def parse_delay_minutes(etd, std):
     """Parse delay in minutes from estimated vs scheduled time"""
-    if etd == 'Delayed' or etd == 'On time':
+    if etd == 'Delayed' or etd == 'On time' or not etd or not std:
         return 0
     
     try:
-        etd_time = datetime.strptime(etd, '%H:%M')
-        std_time = datetime.strptime(std, '%H:%M')
-        
-        # Handle next day times
-        if etd_time < std_time:
-            etd_time += timedelta(days=1)
-            
-        delay_minutes = (etd_time - std_time).total_seconds() / 60
-        return int(delay_minutes)
-    except:
+        # Modulo handles trains running past midnight; a "delay" of half a
+        # day or more is really a train running early
+        delay_minutes = (minute_of_day(etd) - minute_of_day(std)) % 1440
+        return delay_minutes if delay_minutes < 720 else 0
+    except ValueError:
         return 0
 
-def check_trip(trip, config, state):
-    """Check a specific trip configuration"""
-    now = datetime.now()
-    current_day = now.strftime('%A')  # Monday, Tuesday, etc.
-    current_time = now.strftime('%H:%M')
+def is_running_on_time(fields):
+    """Check whether the estimated departure matches the scheduled one"""
+    return fields['etd'] in ('On time', fields['std'])
+
+# Notification rules as (predicate(fields, trip), reason(fields)) pairs,
+# checked in order; the first matching rule decides the alert reason
+NOTIFICATION_RULES = [
+    # Rule 1: Train is cancelled or delayed beyond the trip's threshold
+    (lambda f, trip: f['isCancelled'],
+     lambda f: "CANCELLED"),
+    (lambda f, trip: (not is_running_on_time(f)
+                      and parse_delay_minutes(f['etd'], f['std']) >= trip['_threshold']),
+     lambda f: f"DELAYED {parse_delay_minutes(f['etd'], f['std'])}min"),
+    # Rule 2: Train is on time with platform defined
+    (lambda f, trip: is_running_on_time(f) and f['platform'] and trip['_notify_platform'],
+     lambda f: f"ON TIME - Platform {f['platform']}"),
+]
+
+def match_notification_rule(fields, trip):
+    """Return the reason from the first notification rule the train matches, or None"""
+    for predicate, reason in NOTIFICATION_RULES:
+        if predicate(fields, trip):
+            return reason(fields)
+    return None
+
+def check_trip(trip, config, state, now):
+    """
+    Check a specific trip configuration at the given time.
+    state is only read; the caller records trip_state once the alert has
+    been delivered.
+    Returns: (is_active, alert) where alert is
+    (trip_name, reason, message, trip_state) or None
+    """
+    current_day = now.strftime('%A').lower()  # monday, tuesday, etc.
+    current_time = now.hour * 60 + now.minute
     
     trip_name = trip['name']
     
     vprint(f"\n🚂 Checking trip: {trip_name}")
     vprint(f"📍 Route: {trip['from']} → {trip['to']}")
-    vprint(f"📅 Current: {current_day} {current_time}")
+    vprint(f"📅 Current: {current_day} {now:%H:%M}")
     
     # Check if today is an active day for this trip
-    if not is_day_active(current_day, trip['days']):
+    if not is_day_active(current_day, trip['_days']):
         vprint(f"⏭️  Skipping - not an active day")
-        return state
+        return False, None
     
     # Check if current time is within the monitoring window
-    if not is_time_in_range(current_time, trip['time_start'], trip['time_end']):
+    if not is_time_in_range(current_time, trip['_time_start'], trip['_time_end']):
         vprint(f"⏭️  Skipping - outside time window")
-        return state
+        return False, None
     
     vprint(f"✅ Trip is active - checking trains...")
     
+    alert = None
+    
     # Fetch train data
-    url = f"https://huxley2.azurewebsites.net/departures/{trip['from']}/to/{trip['to']}"
+    # Ask Huxley for just the rows we look at, keeping the payload small
+    url = f"https://huxley2.azurewebsites.net/departures/{trip['from']}/to/{trip['to']}/{TRAINS_TO_CHECK}"
     vprint(f"🌐 API URL: {url}")
     
     try:
-        with urllib.request.urlopen(url, timeout=10) as resp:
-            data = json.loads(resp.read().decode())
-            trains = data.get('trainServices', [])
+        data = json.loads(cached_get(url))
+        trains = data.get('trainServices', [])
+        
+        if not trains:
+            vprint(f"📭 No trains found")
+            return True, None
+        
+        vprint(f"🚊 Found {len(trains)} trains:")
             
-            if not trains:
-                vprint(f"📭 No trains found")
-                return state
+        # Get last notification state for this trip
+        last_state = state.get(trip_name, {})
+        last_signature = tuple(last_state.get('signature') or ())
+        last_train_time = last_state.get('train_time')
+        last_notified = last_state.get('timestamp')
+        
+        if last_notified:
+            vprint(f"📌 Last notification: {last_notified} for {last_train_time} train")
+        else:
+            vprint(f"📌 No previous notification for this trip")
+            
+        # Check the next few trains for notification-worthy conditions
+        for i, train in enumerate(trains[:TRAINS_TO_CHECK]):
+            # Pull out the fields the rules and message need, once per train
+            fields = {
+                'std': train.get('std', 'Unknown'),
+                'etd': train.get('etd', train.get('std')),
+                'isCancelled': train.get('isCancelled', False),
+                'platform': train.get('platform'),
+                'destination': train['destination'][0].get('locationName', trip['to']) if train.get('destination') else trip['to']
+            }
+            train_time, etd, platform = fields['std'], fields['etd'], fields['platform']
+            train_dest = fields['destination']
+            
+            vprint(f"  {i+1}. {train_time} to {train_dest} - ETD: {etd} - Platform: {platform or 'TBC'}")
+            if not fields['isCancelled'] and not is_running_on_time(fields):
+                vprint(f"    ⏱️  Delay: {parse_delay_minutes(etd, train_time)}min (threshold: {trip['_threshold']}min)")
             
-            vprint(f"🚊 Found {len(trains)} trains:")
+            # Determine if we should notify
+            notification_reason = match_notification_rule(fields, trip)
+            should_notify = notification_reason is not None
+            if should_notify:
+                vprint(f"    🎯 Rule matched: {notification_reason}")
+            
+            # Golden Rule: Check if this notification would be a duplicate
+            if should_notify:
+                should_notify_result, reason = should_notify_train(train, last_state, now.timestamp())
                 
-            # Get last notification state for this trip
-            last_state = state.get(trip_name, {})
-            last_signature = last_state.get('signature')
-            last_train_time = last_state.get('train_time')
-            last_notified = last_state.get('timestamp')
+                if not should_notify_result:
+                    if reason == "duplicate":
+                        vprint(f"    🔄 Duplicate notification detected - skipping")
+                        vprint(f"       Train time: {train_time}, Last notified: {last_train_time}")
+                        current_sig = get_train_signature(train)
+                        vprint(f"       Last: {last_signature}")
+                        vprint(f"       Now:  {current_sig}")
+                    elif reason == "recently_notified":
+                        vprint(f"    🔄 Same alert sent in the last {RECENT_SIGNATURE_TTL_SECONDS // 60}min - skipping")
+                    should_notify = False
+                else:
+                    vprint(f"    ✨ Notification approved - {reason}")
+                    if reason == "changed":
+                        current_sig = get_train_signature(train)
+                        vprint(f"       Old signature: {last_signature}")
+                        vprint(f"       New signature: {current_sig}")
+                    elif reason == "new_train":
+                        vprint(f"       Different train time: {train_time} (was {last_train_time})")
+                    elif reason == "first_notification":
+                        vprint(f"       First notification for this trip")
             
-            if last_notified:
-                vprint(f"📌 Last notification: {last_notified} for {last_train_time} train")
-            else:
-                vprint(f"📌 No previous notification for this trip")
+            # Send notification if conditions met
+            if should_notify:
+                from_name = data.get('locationName', trip['from'])
                 
-            # Check the next few trains for notification-worthy conditions
-            for i, train in enumerate(trains[:3]):  # Check first 3 trains
-                train_time = train.get('std', 'Unknown')
-                train_dest = train['destination'][0].get('locationName', trip['to']) if train.get('destination') else trip['to']
-                etd = train.get('etd', train.get('std'))
-                platform = train.get('platform')
-                is_cancelled = train.get('isCancelled', False)
+                message = f"🚂 {trip_name}\n"
+                message += f"Train {train_time} {from_name} → {train_dest}\n"
                 
-                vprint(f"  {i+1}. {train_time} to {train_dest} - ETD: {etd} - Platform: {platform or 'TBC'}")
+                if fields['isCancelled']:
+                    message += f"Status: ❌ CANCELLED"
+                elif "DELAYED" in notification_reason:
+                    delay_mins = parse_delay_minutes(etd, train_time)
+                    message += f"Status: ⏰ DELAYED {delay_mins} minutes\n"
+                    message += f"Expected: {etd}"
+                else:
+                    message += f"Status: ✅ ON TIME"
                 
-                # Determine if we should notify
-                should_notify = False
-                notification_reason = None
+                if platform:
+                    message += f"\nPlatform: {platform}"
                 
-                # Rule 1: Train is cancelled or delayed
-                if is_cancelled:
-                    should_notify = True
-                    notification_reason = "CANCELLED"
-                    vprint(f"    ❌ Train is cancelled")
-                    
-                elif etd != 'On time' and etd != train.get('std'):
-                    std = train.get('std')
-                    delay_mins = parse_delay_minutes(etd, std)
-                    threshold = trip['criteria'].get('delay_threshold_minutes', 5)
-                    
-                    vprint(f"    ⏱️  Delay: {delay_mins}min (threshold: {threshold}min)")
-                    
-                    if delay_mins >= threshold:
-                        should_notify = True
-                        notification_reason = f"DELAYED {delay_mins}min"
-                        vprint(f"    ⚠️  Exceeds threshold!")
+                vprint(f"🚨 ALERT: {notification_reason}")
                 
-                # Rule 2: Train is on time with platform defined
-                elif platform and trip['criteria'].get('notify_platform', True):
-                    should_notify = True
-                    notification_reason = f"ON TIME - Platform {platform}"
-                    vprint(f"    🎯 On time with platform assigned")
+                # New state with signature, timestamp, and train time, keeping
+                # only the newest recent alerts; recorded once the alert is sent
+                current_signature = get_train_signature(train)
+                recent = dict(last_state.get('recent', {}))
+                recent[signature_key(current_signature)] = now.timestamp()
+                recent = dict(sorted(recent.items(), key=lambda item: item[1])[-MAX_RECENT_SIGNATURES:])
+                trip_state = {
+                    'signature': current_signature,
+                    'train_time': train_time,
+                    'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
+                    'reason': notification_reason,
+                    'recent': recent
+                }
+                alert = (trip_name, notification_reason, message, trip_state)
                 
-                # Golden Rule: Check if this notification would be a duplicate
-                if should_notify:
-                    should_notify_result, reason = should_notify_train(trip_name, train, last_state)
-                    
-                    if not should_notify_result:
-                        if reason == "duplicate":
-                            vprint(f"    🔄 Duplicate notification detected - skipping")
-                            vprint(f"       Train time: {train_time}, Last notified: {last_train_time}")
-                            current_sig = get_train_signature(trip_name, train)
-                            vprint(f"       Last: {last_signature}")
-                            vprint(f"       Now:  {current_sig}")
-                        elif reason == "too_soon":
-                            vprint(f"    ⏱️  Too soon since last notification - skipping")
-                            vprint(f"       This train: {train_time}, Last notified: {last_train_time}")
-                        should_notify = False
-                    else:
-                        vprint(f"    ✨ Notification approved - {reason}")
-                        if reason == "changed":
-                            current_sig = get_train_signature(trip_name, train)
-                            vprint(f"       Old signature: {last_signature}")
-                            vprint(f"       New signature: {current_sig}")
-                        elif reason == "new_train":
-                            vprint(f"       Different train time: {train_time} (was {last_train_time})")
-                        elif reason == "first_notification":
-                            vprint(f"       First notification for this trip")
+                break  # Only alert for the first relevant train
+            else:
+                vprint(f"    ⏭️  No notification needed")
                 
-                # Send notification if conditions met
-                if should_notify:
-                    from_name = data.get('locationName', trip['from'])
-                    
-                    message = f"🚂 {trip_name}\n"
-                    message += f"Train {train_time} {from_name} → {train_dest}\n"
-                    
-                    if is_cancelled:
-                        message += f"Status: ❌ CANCELLED"
-                    elif "DELAYED" in notification_reason:
-                        delay_mins = parse_delay_minutes(etd, std)
-                        message += f"Status: ⏰ DELAYED {delay_mins} minutes\n"
-                        message += f"Expected: {etd}"
-                    else:
-                        message += f"Status: ✅ ON TIME"
-                    
-                    if platform:
-                        message += f"\nPlatform: {platform}"
-                    
-                    vprint(f"🚨 ALERT: {notification_reason}")
-                    vprint(f"📱 Sending message:\n{message}")
-                    
-                    send_telegram(config['telegram_token'], config['telegram_chat_id'], message)
-                    print(f"Alert sent for {trip_name}: {notification_reason}")
-                    
-                    # Update state with new signature, timestamp, and train time
-                    current_signature = get_train_signature(trip_name, train)
-                    state[trip_name] = {
-                        'signature': current_signature,
-                        'train_time': train_time,
-                        'timestamp': now.strftime('%Y-%m-%d %H:%M:%S'),
-                        'reason': notification_reason
-                    }
-                    
-                    break  # Only alert for the first relevant train
-                else:
-                    vprint(f"    ⏭️  No notification needed")
-                    
     except Exception as e:
         print(f"❌ Train API error for {trip_name}: {e}")
     
+    return True, alert
+
+def check_all_trips(config, state):
+    """Run one monitoring pass over every configured trip"""
+    trips = config.get('trips', [])
+    now = datetime.now()
+    
+    # Trips are I/O-bound, so check them in parallel; they only read state
+    results = []
+    if trips:
+        vprint(f"\n--- Checking {len(trips)} trips ---")
+        # Verbose output is per-line, so check one trip at a time to keep it readable
+        workers = 1 if VERBOSE else min(MAX_WORKERS, len(trips))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # map() yields results in config order, whichever trip finishes first
+            results = list(executor.map(lambda trip: check_trip(trip, config, state, now), trips))
+    
+    active_trips = sum(is_active for is_active, _ in results)
+    alerts = [alert for _, alert in results if alert]
+    
+    # Alerts that fired together go out together
+    if alerts:
+        send_alerts(config, state, alerts)
+    
+    # Save updated state
+    save_state(state)
+    
+    if VERBOSE:
+        print(f"\n📊 Summary: {active_trips}/{len(trips)} trips currently active")
+        print(f"✅ Monitoring complete")
+    
     return state
 
 def main():
@@ -318,7 +574,13 @@ def main():
     parser = argparse.ArgumentParser(description='Monitor UK trains and send Telegram notifications')
     parser.add_argument('-v', '--verbose', action='store_true', 
                        help='Enable verbose output for testing and debugging')
+    parser.add_argument('--daemon', action='store_true',
+                       help='Keep running and poll every --interval seconds instead of exiting')
+    parser.add_argument('--interval', type=int, default=60,
+                       help='Seconds between polls in daemon mode (default: 60)')
     args = parser.parse_args()
+    if args.interval < 1:
+        parser.error('--interval must be at least 1 second')
     
     VERBOSE = args.verbose
     
@@ -338,26 +600,19 @@ def main():
     # Load notification state
     state = load_state()
     
-    # Process each trip configuration
-    active_trips = 0
-    for i, trip in enumerate(config.get('trips', [])):
-        vprint(f"\n--- Trip {i+1}/{len(config['trips'])} ---")
-        state = check_trip(trip, config, state)
-        
-        # Count active trips for summary
-        now = datetime.now()
-        current_day = now.strftime('%A')
-        current_time = now.strftime('%H:%M')
-        if (is_day_active(current_day, trip['days']) and 
-            is_time_in_range(current_time, trip['time_start'], trip['time_end'])):
-            active_trips += 1
+    if not args.daemon:
+        check_all_trips(config, state)
+        return
     
-    # Save updated state
-    save_state(state)
-    
-    if VERBOSE:
-        print(f"\n📊 Summary: {active_trips}/{len(config.get('trips', []))} trips currently active")
-        print(f"✅ Monitoring complete")
+    # Daemon mode: state and HTTPS connections stay warm between polls
+    print(f"🔁 Daemon mode - polling every {args.interval}s (Ctrl+C to stop)")
+    try:
+        while True:
+            vprint(f"\n⏰ Poll at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+            state = check_all_trips(config, state)
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        print(f"\n👋 Stopped")
 
 if __name__ == '__main__':
     main()